@@ -14,9 +14,12 @@
 
 import os
 import io
-import csv
+import asyncio
 import json
+import functools
+import re
 from datetime import datetime
+from operator import itemgetter
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 import discord
@@ -31,6 +34,9 @@ load_dotenv()
 
 TOKEN = os.getenv("DISCORD_TOKEN")
 DEFAULT_CHANNEL_ID_ENV = os.getenv("DEFAULT_CHANNEL_ID")  # Optional fallback channel
+DEFAULT_CHANNEL_ID: int | None = (
+    int(DEFAULT_CHANNEL_ID_ENV) if DEFAULT_CHANNEL_ID_ENV and DEFAULT_CHANNEL_ID_ENV.strip().isdecimal() else None
+)
 FORCED_LANG = (os.getenv("BOT_LANG") or "").strip().lower()  # 'de' | 'en'
 LANG_FILE = os.getenv("LANG_FILE") or "lang.json"
 BOT_TZ = (os.getenv("BOT_TZ") or "UTC").strip()  # Default: UTC
@@ -40,11 +46,13 @@ BOT_DATEFMT = os.getenv("BOT_DATEFMT")  # Optional → overrides language-based
 try:
     CONFIG_TZ = ZoneInfo(BOT_TZ)
     TZ_VALID = True
-except (ZoneInfoNotFoundError, Exception):
+except (ZoneInfoNotFoundError, ValueError):  # Unknown zone / malformed key (e.g. '', '../x')
     CONFIG_TZ = ZoneInfo("UTC")
     TZ_VALID = False
     print(f"[WARN] Invalid BOT_TZ '{BOT_TZ}' in .env. Falling back to UTC.")
 
+BERLIN_TZ = ZoneInfo("Europe/Berlin")  # Fixed zone for filenames
+
 intents = discord.Intents.default()
 intents.guilds = True
 intents.members = True  # Privileged intent (must be enabled in Dev Portal)
@@ -56,54 +64,67 @@ tree = bot.tree
 # Localization
 # =========================
 _LANG_CACHE: dict = {}
-
+_RESOLVED: dict = {}  # lang -> {key: text} with the en/de fallback chain already applied
+
+# Built-in strings, used when LANG_FILE is missing
+_FALLBACK_LANG = {
+    "de": {
+        "cmd.description": "CSV-Snapshot aller Mitglieder mit einer Rolle; Upload in einen Kanal.",
+        "arg.role": "Rolle, deren Mitglieder erfasst werden",
+        "arg.channel": "(Optional) Zielkanal für die CSV (sonst Default- oder aktueller Kanal)",
+        "err.need_manage_guild": "❌ Du benötigst die Berechtigung **Server verwalten**.",
+        "err.guild_only": "❌ Dieser Befehl kann nur in einem Server genutzt werden.",
+        "err.no_target_channel": "❌ Konnte keinen Zielkanal ermitteln.",
+        "err.missing_perms": "❌ Fehlende Rechte in {channel} (Nachrichten senden / Dateien anhängen / Kanal ansehen).",
+        "err.send_forbidden": "❌ Keine Berechtigung, in {channel} zu posten.",
+        "err.unexpected_send": "❌ Unerwarteter Fehler beim Senden der Datei: `{error}`",
+        "warn.invalid_tz": "⚠️ Ungültige Zeitzone in .env: '{tz}'. Es wird **UTC** verwendet. "
+                           "Setze `BOT_TZ` auf eine gültige IANA-Zeitzone (z. B. Europe/Berlin).",
+        "ok.posted": "✅ Snapshot erstellt und in {channel} gepostet.",
+        "post.header": "📸 Snapshot für Rolle <@&{role_id}> – {count} Nutzer",
+        "post.timestamp": "🕒 Erstellt am: {timestamp}",
+        "csv.header.timestamp": "Zeitstempel",
+        "csv.header.username": "Username",
+        "csv.header.discord_id": "Discord-ID"
+    },
+    "en": {
+        "cmd.description": "CSV snapshot of members with a role; uploads to a channel.",
+        "arg.role": "Role whose members to snapshot",
+        "arg.channel": "(Optional) Target channel for the CSV (else default/current)",
+        "err.need_manage_guild": "❌ You need the **Manage Server** permission.",
+        "err.guild_only": "❌ This command can only be used in a server.",
+        "err.no_target_channel": "❌ Could not determine a target channel.",
+        "err.missing_perms": "❌ Missing permissions in {channel} (Send Messages / Attach Files / View Channel).",
+        "err.send_forbidden": "❌ No permission to post in {channel}.",
+        "err.unexpected_send": "❌ Unexpected error while sending the file: `{error}`",
+        "warn.invalid_tz": "⚠️ Invalid timezone in .env: '{tz}'. Using **UTC**. "
+                           "Set `BOT_TZ` to a valid IANA zone (e.g., Europe/Berlin).",
+        "ok.posted": "✅ Snapshot created and posted in {channel}.",
+        "post.header": "📸 Snapshot for role <@&{role_id}> – {count} members",
+        "post.timestamp": "🕒 Created at: {timestamp}",
+        "csv.header.timestamp": "Timestamp",
+        "csv.header.username": "Username",
+        "csv.header.discord_id": "Discord ID"
+    }
+}
+
+@functools.cache
 def load_lang():
-    """Load lang.json into cache, with built-in fallback if missing."""
-    global _LANG_CACHE
+    """Load lang.json into cache, with built-in fallback if missing. Runs once; later calls are no-ops."""
+    global _LANG_CACHE, _RESOLVED
     try:
         with open(LANG_FILE, "r", encoding="utf-8") as f:
             _LANG_CACHE = json.load(f)
     except FileNotFoundError:
-        _LANG_CACHE = {
-            "de": {
-                "cmd.description": "CSV-Snapshot aller Mitglieder mit einer Rolle; Upload in einen Kanal.",
-                "arg.role": "Rolle, deren Mitglieder erfasst werden",
-                "arg.channel": "(Optional) Zielkanal für die CSV (sonst Default- oder aktueller Kanal)",
-                "err.need_manage_guild": "❌ Du benötigst die Berechtigung **Server verwalten**.",
-                "err.guild_only": "❌ Dieser Befehl kann nur in einem Server genutzt werden.",
-                "err.no_target_channel": "❌ Konnte keinen Zielkanal ermitteln.",
-                "err.missing_perms": "❌ Fehlende Rechte in {channel} (Nachrichten senden / Dateien anhängen / Kanal ansehen).",
-                "err.send_forbidden": "❌ Keine Berechtigung, in {channel} zu posten.",
-                "err.unexpected_send": "❌ Unerwarteter Fehler beim Senden der Datei: `{error}`",
-                "warn.invalid_tz": "⚠️ Ungültige Zeitzone in .env: '{tz}'. Es wird **UTC** verwendet. "
-                                   "Setze `BOT_TZ` auf eine gültige IANA-Zeitzone (z. B. Europe/Berlin).",
-                "ok.posted": "✅ Snapshot erstellt und in {channel} gepostet.",
-                "post.header": "📸 Snapshot für Rolle <@&{role_id}> – {count} Nutzer",
-                "post.timestamp": "🕒 Erstellt am: {timestamp}",
-                "csv.header.timestamp": "Zeitstempel",
-                "csv.header.username": "Username",
-                "csv.header.discord_id": "Discord-ID"
-            },
-            "en": {
-                "cmd.description": "CSV snapshot of members with a role; uploads to a channel.",
-                "arg.role": "Role whose members to snapshot",
-                "arg.channel": "(Optional) Target channel for the CSV (else default/current)",
-                "err.need_manage_guild": "❌ You need the **Manage Server** permission.",
-                "err.guild_only": "❌ This command can only be used in a server.",
-                "err.no_target_channel": "❌ Could not determine a target channel.",
-                "err.missing_perms": "❌ Missing permissions in {channel} (Send Messages / Attach Files / View Channel).",
-                "err.send_forbidden": "❌ No permission to post in {channel}.",
-                "err.unexpected_send": "❌ Unexpected error while sending the file: `{error}`",
-                "warn.invalid_tz": "⚠️ Invalid timezone in .env: '{tz}'. Using **UTC**. "
-                                   "Set `BOT_TZ` to a valid IANA zone (e.g., Europe/Berlin).",
-                "ok.posted": "✅ Snapshot created and posted in {channel}.",
-                "post.header": "📸 Snapshot for role <@&{role_id}> – {count} members",
-                "post.timestamp": "🕒 Created at: {timestamp}",
-                "csv.header.timestamp": "Timestamp",
-                "csv.header.username": "Username",
-                "csv.header.discord_id": "Discord ID"
-            }
-        }
+        _LANG_CACHE = _FALLBACK_LANG
+
+    en = _LANG_CACHE.get("en", {})
+    de = _LANG_CACHE.get("de", {})
+    all_keys = {k for lang_dict in _LANG_CACHE.values() for k in lang_dict}
+    _RESOLVED = {
+        lang: {k: lang_dict.get(k) or en.get(k) or de.get(k) or k for k in all_keys}
+        for lang, lang_dict in _LANG_CACHE.items()
+    }
 
 def pick_lang(interaction: discord.Interaction) -> str:
     """Determine language: .env BOT_LANG > interaction/guild locale > fallback."""
@@ -126,17 +147,22 @@ def pick_lang(interaction: discord.Interaction) -> str:
 
 def t(lang: str, key: str, **kwargs) -> str:
     """Translation helper with placeholder replacement."""
-    text = _LANG_CACHE.get(lang, {}).get(key) or _LANG_CACHE.get("en", {}).get(key) or _LANG_CACHE.get("de", {}).get(key) or key
+    table = _RESOLVED.get(lang) or _RESOLVED.get("en") or _RESOLVED.get("de") or {}
+    text = table.get(key, key)
+    if not kwargs:
+        return text
     try:
         return text.format_map(kwargs)
     except Exception:
         return text
 
-load_lang()
-
 # =========================
 # Helper functions
 # =========================
+_FMT_DE = "%d.%m.%Y %H:%M:%S"
+_FMT_EN = "%Y-%m-%d %H:%M:%S"
+_FMT_BY_LANG = {"de": _FMT_DE, "en": _FMT_EN}
+
 def format_timestamp(dt: datetime, lang: str) -> str:
     """
     Format timestamp:
@@ -144,45 +170,67 @@ def format_timestamp(dt: datetime, lang: str) -> str:
       - Else: use language defaults ('de' -> dd.mm.yyyy HH:MM:SS, 'en' -> yyyy-mm-dd HH:MM:SS)
     Timezone comes from validated CONFIG_TZ (fallback UTC).
     """
-    if BOT_DATEFMT:
-        fmt = BOT_DATEFMT
-    elif lang == "de":
-        fmt = "%d.%m.%Y %H:%M:%S"
-    else:
-        fmt = "%Y-%m-%d %H:%M:%S"
-    return dt.astimezone(CONFIG_TZ).strftime(fmt)
+    return dt.astimezone(CONFIG_TZ).strftime(BOT_DATEFMT or _FMT_BY_LANG.get(lang, _FMT_EN))
+
+_FILENAME_UNSAFE_RE = re.compile(r"[^\w \-]")  # Everything except alphanumerics, space, '_' and '-'
 
 def make_filename(role_name: str) -> str:
     """Generate a safe filename from role name + current timestamp (always in Europe/Berlin for local consistency)."""
-    now = datetime.now(ZoneInfo("Europe/Berlin")).strftime("%Y-%m-%d_%H-%M-%S")
-    safe_role = "".join(c for c in role_name if c.isalnum() or c in (" ", "_", "-")).strip().replace(" ", "_")
+    now = datetime.now(BERLIN_TZ).strftime("%Y-%m-%d_%H-%M-%S")
+    safe_role = _FILENAME_UNSAFE_RE.sub("", role_name).strip().replace(" ", "_")
     return f"snapshot_{safe_role}_{now}.csv"
 
 async def ensure_full_member_cache(guild: discord.Guild) -> None:
-    """Try to fully load all members into the cache."""
+    """Try to fully load all members into the cache (chunk first, fetch only as fallback)."""
+    if guild.chunked:
+        return  # Cache is already complete and kept current by member gateway events
     try:
         await guild.chunk()
     except Exception:
         pass
+    if guild.chunked:
+        return
     try:
         async for _ in guild.fetch_members(limit=None):
             pass
     except Exception:
         pass
 
+_NEWLINE_TABLE = str.maketrans({"\r": " ", "\n": " "})  # Keeps usernames on one CSV line
+
+_CSV_NEEDS_QUOTES_RE = re.compile(r'[;"\r\n]')
+
+def csv_field(value: str) -> str:
+    """Quote a CSV field only when needed (';' delimiter, '"' qualifier, embedded quotes doubled)."""
+    if _CSV_NEEDS_QUOTES_RE.search(value):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+def build_csv(members: list[tuple[str, str, int]], snapshot_time: str, lang: str) -> io.BytesIO:
+    """Build the Excel-friendly CSV (UTF-8 BOM, ';', CRLF) from sorted (sort key, name, id) rows; returns a rewound buffer."""
+    row_prefix = csv_field(snapshot_time) + ";"  # Same timestamp on every row
+    buf = io.BytesIO(bytes(len(members) * 64 + 128))  # Preallocate ~64 bytes/row, truncated below
+    buf.write(b"\xef\xbb\xbf")  # UTF-8 BOM so Excel detects the encoding
+    buf.write((";".join([
+        csv_field(t(lang, "csv.header.timestamp")),
+        csv_field(t(lang, "csv.header.username")),
+        csv_field(t(lang, "csv.header.discord_id"))
+    ]) + "\r\n").encode("utf-8"))
+    buf.writelines(
+        f"{row_prefix}{csv_field(name.translate(_NEWLINE_TABLE).strip())};{member_id}\r\n".encode("utf-8")
+        for _, name, member_id in members
+    )
+    buf.truncate(buf.tell())
+    buf.seek(0)
+    return buf
+
 def user_has_manage_guild(interaction: discord.Interaction) -> bool:
     """Check if the invoking user has 'Manage Server' permission."""
     return interaction.user.guild_permissions.manage_guild
 
 def resolve_default_channel(guild: discord.Guild):
     """Resolve DEFAULT_CHANNEL_ID from .env, return channel or None."""
-    if not DEFAULT_CHANNEL_ID_ENV:
-        return None
-    try:
-        cid = int(DEFAULT_CHANNEL_ID_ENV)
-        return guild.get_channel(cid)
-    except Exception:
-        return None
+    return guild.get_channel(DEFAULT_CHANNEL_ID) if DEFAULT_CHANNEL_ID else None
 
 # =========================
 # Slash command
@@ -200,76 +248,63 @@ async def snapshot(
     role: discord.Role,
     channel: discord.TextChannel | None = None
 ):
+    load_lang()
     lang = pick_lang(interaction)
 
+    # Acknowledge within Discord's 3s deadline; everything below answers via followup
+    if not interaction.response.is_done():
+        await interaction.response.defer(thinking=True, ephemeral=True)
+
     # Ephemeral warning if timezone is invalid
-    if not TZ_VALID and not interaction.response.is_done():
-        await interaction.response.send_message(
-            t(lang, "warn.invalid_tz", tz=BOT_TZ),
-            ephemeral=True
-        )
+    if not TZ_VALID:
+        await interaction.followup.send(t(lang, "warn.invalid_tz", tz=BOT_TZ), ephemeral=True)
 
     # Permission check
     if not user_has_manage_guild(interaction):
-        if interaction.response.is_done():
-            return await interaction.followup.send(t(lang, "err.need_manage_guild"), ephemeral=True)
-        else:
-            return await interaction.response.send_message(t(lang, "err.need_manage_guild"), ephemeral=True)
-
-    if not interaction.response.is_done():
-        await interaction.response.defer(thinking=True, ephemeral=True)
+        return await interaction.followup.send(t(lang, "err.need_manage_guild"), ephemeral=True)
 
     guild = interaction.guild
     if guild is None:
         return await interaction.followup.send(t(lang, "err.guild_only"), ephemeral=True)
 
+    # Start member loading now; it overlaps with the local work below
+    chunk_task = asyncio.create_task(ensure_full_member_cache(guild))
+
     target_channel: discord.TextChannel | None = channel or resolve_default_channel(guild) or interaction.channel  # type: ignore
     if target_channel is None:
+        chunk_task.cancel()
         return await interaction.followup.send(t(lang, "err.no_target_channel"), ephemeral=True)
-
-    await ensure_full_member_cache(guild)
+    channel_mention = getattr(target_channel, "mention", "#channel")
 
     snapshot_time = format_timestamp(datetime.now(), lang)
-
-    members = list(role.members)
-    members.sort(key=lambda m: (m.display_name or m.name).lower())
-
-    # Build CSV (Excel-friendly)
-    buf = io.StringIO()
-    writer = csv.writer(
-        buf,
-        delimiter=';',
-        lineterminator='\r\n',
-        quoting=csv.QUOTE_ALL,
-        quotechar='"',
-        escapechar='\\'
-    )
-    writer.writerow([
-        t(lang, "csv.header.timestamp"),
-        t(lang, "csv.header.username"),
-        t(lang, "csv.header.discord_id")
-    ])
-    for m in members:
-        username = (m.display_name or m.name).replace("\r", " ").replace("\n", " ").strip()
-        writer.writerow([snapshot_time, username, str(m.id)])
-
-    csv_bytes = buf.getvalue().encode("utf-8-sig")
-    buf.close()
-
     filename = make_filename(role.name)
-    file = discord.File(io.BytesIO(csv_bytes), filename=filename)
 
     # Channel permission checks
     try:
         perms = target_channel.permissions_for(guild.me)  # type: ignore
         if not (perms.send_messages and perms.attach_files and perms.view_channel):
+            chunk_task.cancel()
             return await interaction.followup.send(
-                t(lang, "err.missing_perms", channel=getattr(target_channel, "mention", "#channel")),
+                t(lang, "err.missing_perms", channel=channel_mention),
                 ephemeral=True
             )
     except Exception:
         pass
 
+    await chunk_task
+
+    # role.members is one scan over the guild cache (snowflake lookup per member);
+    # read it exactly once and resolve each name: (sort key, display name, id)
+    members = []
+    for m in role.members:
+        name = m.display_name or m.name
+        members.append((name.lower(), name, m.id))
+    members.sort(key=itemgetter(0))
+
+    # Build CSV off the event loop; members is a plain list, safe to hand to a thread
+    buf = await asyncio.to_thread(build_csv, members, snapshot_time, lang)
+    file = discord.File(buf, filename=filename)
+
     # Send message + file
     try:
         await target_channel.send(
@@ -282,7 +317,7 @@ async def snapshot(
         )
     except discord.Forbidden:
         return await interaction.followup.send(
-            t(lang, "err.send_forbidden", channel=getattr(target_channel, "mention", "#channel")),
+            t(lang, "err.send_forbidden", channel=channel_mention),
             ephemeral=True
         )
     except Exception as e:
@@ -292,17 +327,23 @@ async def snapshot(
         )
 
     await interaction.followup.send(
-        t(lang, "ok.posted", channel=getattr(target_channel, "mention", "#channel")),
+        t(lang, "ok.posted", channel=channel_mention),
         ephemeral=True
     )
 
 # =========================
 # Bot lifecycle
 # =========================
+_TREE_SYNCED = False  # on_ready fires again on every reconnect; sync only the first time
+
 @bot.event
 async def on_ready():
+    global _TREE_SYNCED
+    if _TREE_SYNCED:
+        return
     try:
         await tree.sync()
+        _TREE_SYNCED = True
         tz_key = getattr(CONFIG_TZ, "key", str(CONFIG_TZ))
         print(f"Logged in as {bot.user} | Slash commands synced. (BOT_TZ='{BOT_TZ}', valid={TZ_VALID}, using='{tz_key}')")
         if not TZ_VALID: